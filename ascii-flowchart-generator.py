@@ -1,9 +1,11 @@
 import ast
 import astpp
-import numpy as np
+import collections
 
 
 class FlowchartNode:
+    __slots__ = ('parent', 'child', 'row', 'col')  # slots keep nodes small and stop typos from quietly making new attributes
+
     def __init__(self, parent):
         self.parent = parent
         self.child = None
@@ -15,6 +17,8 @@ class FlowchartNode:
 
 
 class StartNode(FlowchartNode):
+    __slots__ = ('name', 'inputs', 'outputs')
+
     def __init__(self, text):
         self.name = text
         super().__init__(None)
@@ -26,6 +30,8 @@ class StartNode(FlowchartNode):
 
 
 class InputNode(FlowchartNode):
+    __slots__ = ('name',)
+
     def __init__(self, parent, varName):
         self.name = varName
         super().__init__(parent)
@@ -35,6 +41,8 @@ class InputNode(FlowchartNode):
 
 
 class OutputNode(FlowchartNode):
+    __slots__ = ('name',)
+
     def __init__(self, parent, varName):
         self.name = varName
         super().__init__(parent)
@@ -44,6 +52,8 @@ class OutputNode(FlowchartNode):
 
 
 class ProcessNode(FlowchartNode):
+    __slots__ = ('text',)
+
     def __init__(self, parent, text):
         self.text = text
         super().__init__(parent)
@@ -53,12 +63,16 @@ class ProcessNode(FlowchartNode):
 
 
 class VariableAssignmentNode(ProcessNode):
+    __slots__ = ()
+
     def __init__(self, parent, varName, expression):
         text = "{} = {}".format(varName, expression)
         super().__init__(parent, text)
 
 
 class ConditionalNode(FlowchartNode):
+    __slots__ = ('condition',)
+
     def __init__(self, parent, condition):
         self.condition = condition
         super().__init__(parent)
@@ -69,6 +83,8 @@ class ConditionalNode(FlowchartNode):
 
 
 class SubProcessNode(FlowchartNode):
+    __slots__ = ('name',)
+
     def __init__(self, parent, subprocessName):
         self.name = subprocessName
         super().__init__(parent)
@@ -78,6 +94,8 @@ class SubProcessNode(FlowchartNode):
 
 
 class DummyConjunctionNode(FlowchartNode):  # node to allow two nodes to return to the same place
+    __slots__ = ('parent2',)
+
     def __init__(self, parent1, parent2):
         self.parent2 = parent2
         super().__init__(parent1)
@@ -87,63 +105,70 @@ class DummyConjunctionNode(FlowchartNode):  # node to allow two nodes to return
 
 
 class DummyMiddleNode(FlowchartNode):
+    __slots__ = ()
+
     def __str__(self):
         return ''
 
 
-class FlowchartMakingVisitor(ast.NodeVisitor):
-    operators = {ast.Mult: '*', ast.Add: '+', ast.Sub: '-', ast.Div: '/', ast.Or: 'or', ast.And: 'and', ast.Gt: '>', ast.Lt: '<', ast.Eq: '=', ast.NotEq: '!='}
+operators = {ast.Mult: '*', ast.Add: '+', ast.Sub: '-', ast.Div: '/', ast.Or: 'or', ast.And: 'and', ast.Gt: '>', ast.Lt: '<', ast.Eq: '=', ast.NotEq: '!='}  # keyed on the exact operator class
 
+
+class FlowchartMakingVisitor(ast.NodeVisitor):
     def __init__(self):
         self.start = StartNode("start")
         self.currentParent = self.start
 
     def visit_Module(self, node: ast.Module):
-        for n in node.body:
-            self.visit(n)
+        self.visitBlock(node.body)
 
     def visit_Assign(self, node):
-        if isinstance(node.value, ast.Call):  # special case for / input / nodes
-            if node.value.func.id == 'input':
+        value = node.value
+        if isinstance(value, ast.Call):  # special case for / input / nodes
+            if getattr(value.func, 'id', None) == 'input':
                 self.appendNode(InputNode(self.currentParent, node.targets[0].id))
                 return
-            if isinstance(node.value.args[0], ast.Call) and node.value.args[0].func.id == 'input':  # basically, assume that any single function wrapping an input() statement in an assign is just a typecast
+            if value.args and isinstance(value.args[0], ast.Call) and getattr(value.args[0].func, 'id', None) == 'input':  # basically, assume that any single function wrapping an input() statement in an assign is just a typecast
                 self.appendNode(InputNode(self.currentParent, node.targets[0].id))
                 return
-        rhs = self.parseChunk(node.value)
+        rhs = self.parseChunk(value)
         self.appendNode(VariableAssignmentNode(self.currentParent, node.targets[0].id, rhs))
 
     def visit_AugAssign(self, node):
         rhs = self.parseChunk(node.value)
-        self.appendNode(VariableAssignmentNode(self.currentParent, node.target.id, "{0} {1} {2}".format(node.target.id, self.operators[node.op.__class__], rhs)))
+        self.appendNode(VariableAssignmentNode(self.currentParent, node.target.id, "{0} {1} {2}".format(node.target.id, operators[type(node.op)], rhs)))
 
     def visit_Expr(self, node):
         if isinstance(node.value, ast.Call):
-            if node.value.func.id in {'print', 'pprint'}:  # / output / special casing
+            if getattr(node.value.func, 'id', None) in {'print', 'pprint'}:  # / output / special casing
                 self.appendNode(OutputNode(self.currentParent, ', '.join(self.parseFunctionArgs(node.value))))
             else:
                 self.appendNode(ProcessNode(self.currentParent, self.parseFunctionCall(node.value)))
         else:
             raise Exception("Unknown Node type in Expr: {0} (line {0.lineno} col {0.col_offset})".format(node.value))
 
-    def visit_If(self, node):
+    def visit_If(self, node):  # returns the yes and no branches for visitBlock to go through rather than visiting them itself
         cond = self.parseChunk(node.test)
 
         condNode = ConditionalNode(self.currentParent, cond)
         self.appendNode(condNode)
         condNode.child['Yes'] = DummyMiddleNode(condNode)
         self.currentParent = condNode.child['Yes']
-        for n in node.body:
-            self.visit(n)
-        endbody = self.currentParent  # so we can connect it to the endcap eventually
-        condNode.child['No'] = DummyMiddleNode(condNode)
-        self.currentParent = condNode.child['No']
-        for n in node.orelse:
-            self.visit(n)
-        endcap = DummyConjunctionNode(self.currentParent, endbody)
-        endbody.child = endcap
-        self.currentParent.child = endcap
-        self.currentParent = endcap
+        endbody = None
+
+        def startElse():
+            nonlocal endbody
+            endbody = self.currentParent  # so we can connect it to the endcap eventually
+            condNode.child['No'] = DummyMiddleNode(condNode)
+            self.currentParent = condNode.child['No']
+
+        def joinBranches():
+            endcap = DummyConjunctionNode(self.currentParent, endbody)
+            endbody.child = endcap
+            self.currentParent.child = endcap
+            self.currentParent = endcap
+
+        return [(node.body, startElse), (node.orelse, joinBranches)]
 
     def visit_ImportFrom(self, node):
         pass
@@ -151,12 +176,41 @@ class FlowchartMakingVisitor(ast.NodeVisitor):
     def generic_visit(self, node):
         raise Exception("Unknown Node type: {0} (line {0.lineno} col {0.col_offset})".format(node))
 
+    def visit(self, node):  # replaces ast.NodeVisitor.visit, which builds the method name and getattr()s it for every statement
+        visitor = self.statementVisitors.get(type(node))
+        if visitor is None:
+            return self.generic_visit(node)
+        return visitor(self, node)
+
+    def visitBlock(self, body):  # nested ifs and whiles go on an explicit stack instead of recursing, so deep nesting can't hit the recursion limit
+        blocks = [(iter(body), None)]
+        while blocks:
+            statements, onEnd = blocks[-1]
+            n = next(statements, None)
+            if n is None:
+                blocks.pop()
+                if onEnd is not None:
+                    onEnd()
+                continue
+            nested = self.visit(n)  # list of (statements, called once they're all visited), first one gets visited first
+            if nested:
+                blocks.extend((iter(b), e) for b, e in reversed(nested))
+
+    statementVisitors = {
+        ast.Module: visit_Module,
+        ast.Assign: visit_Assign,
+        ast.AugAssign: visit_AugAssign,
+        ast.Expr: visit_Expr,
+        ast.If: visit_If,
+        ast.ImportFrom: visit_ImportFrom,
+    }
+
     def appendNode(self, node):
         self.currentParent.child = node
         self.currentParent = node
 
     def parseFunctionCall(self, call):
-        name = call.func.id
+        name = self.parseChunk(call.func)  # a plain name or an attribute like obj.method
         args = self.parseFunctionArgs(call)
         return "{0}({1})".format(name, ', '.join(map(str, args)))
 
@@ -170,74 +224,90 @@ class FlowchartMakingVisitor(ast.NodeVisitor):
         left = self.parseChunk(op.left)
         right = self.parseChunk(op.right)
 
-        return "{0} {1} {2}".format(left, self.operators[op.op.__class__], right)
+        return "{0} {1} {2}".format(left, operators[type(op.op)], right)
 
     def parseBoolOp(self, op):
         things = []
         for thing in op.values:
             things.append(self.parseChunk(thing))
-        return (' ' + self.operators[op.op.__class__] + ' ').join(things)
+        return (' ' + operators[type(op.op)] + ' ').join(things)
 
     def parseCompare(self, op):
-        str = self.parseChunk(op.left)
-        for i in range(len(op.ops)):
-            str += ' ' + self.operators[op.ops[i].__class__] + ' ' + self.parseChunk(op.comparators[i])
-        return str
+        parts = [self.parseChunk(op.left)]
+        for o, c in zip(op.ops, op.comparators):
+            parts.append(operators[type(o)])
+            parts.append(self.parseChunk(c))
+        return ' '.join(parts)
+
+    def parseConstant(self, const):
+        if isinstance(const.value, str):
+            return repr(const.value)
+        if isinstance(const.value, (int, float, complex)) and not isinstance(const.value, bool):
+            return str(const.value)
+        raise Exception("Unknown constant to parse: {0!r} (line {1.lineno} col {1.col_offset})".format(const.value, const))
 
     def parseChunk(self, o):  # parse pretty much anything
-        if isinstance(o, ast.BinOp):
-            return '(' + self.parseBinOp(o) + ')'
-        elif isinstance(o, ast.Num):
-            return str(o.n)
-        elif isinstance(o, ast.Name):
-            return o.id
-        elif isinstance(o, ast.Str):
-            return repr(o.s)
-        elif isinstance(o, ast.Call):
-            return self.parseFunctionCall(o)
-        elif isinstance(o, ast.BoolOp):
-            return '(' + self.parseBoolOp(o) + ')'
-        elif isinstance(o, ast.Compare):
-            return '(' + self.parseCompare(o) + ')'
-        else:
+        parser = self.chunkParsers.get(type(o))  # exact type lookup, ast node classes are never subclassed
+        if parser is None:
             raise Exception("Unknown object to parse: {0} (line {0.lineno} col {0.col_offset})".format(o))
+        return parser(self, o)
+
+    chunkParsers = {
+        ast.BinOp: lambda self, o: '(' + self.parseBinOp(o) + ')',
+        ast.Constant: parseConstant,  # numbers and strings both come out of the parser as Constant
+        ast.Name: lambda self, o: o.id,
+        ast.Attribute: lambda self, o: self.parseChunk(o.value) + '.' + o.attr,
+        ast.Call: parseFunctionCall,
+        ast.BoolOp: lambda self, o: '(' + self.parseBoolOp(o) + ')',
+        ast.Compare: lambda self, o: '(' + self.parseCompare(o) + ')',
+    }
 
 
 blockWidth = 60
 blockHeight = 3
+emptyCell = ' ' * blockWidth
+arrowCells = ("{0:^{1}}".format("|", blockWidth), "{0:^{1}}".format("V", blockWidth))  # the two lines under every node are always the same
 
 
 # This stuff is all for printing the graph to the console. It doesn't work well with conditionals, but arrow drawing gets really really complicated quickly. Use the graphviz version instead
-def followNodePath(node, col=0, row=0):
-    if node.col is not None:
-        return
-    node.col = col
-    node.row = row
-    if node.child:
+def followNodePath(start):
+    stack = [(start, 0, 0)]
+    while stack:
+        node, col, row = stack.pop()
+        if node.col is not None:
+            continue
+        node.col = col
+        node.row = row
+        if node.child:
+            if isinstance(node.child, dict):
+                for n in node.child:
+                    if isinstance(node.child[n], DummyMiddleNode):
+                        node.child[n] = node.child[n].child
+                stack.append((node.child["Yes"], col + 1, row))
+                stack.append((node.child["No"], col, row + 1))  # pushed last so the No branch gets laid out first
+            else:
+                stack.append((node.child, col, row + 1))
+
+
+def nodeToText(rows, start):  # returns the row after the lowest node, where the stop goes
+    lastLine = 0
+    drawn = set()  # joins are reached once per incoming branch, but only need drawing once
+    stack = [start]
+    while stack:
+        node = stack.pop()
+        if node in drawn:
+            continue
+        drawn.add(node)
+        rows[node.row * 3][node.col] = "{0:^{1}}".format(str(node), blockWidth)
+        rows[node.row * 3 + 1][node.col], rows[node.row * 3 + 2][node.col] = arrowCells
         if isinstance(node.child, dict):
-            if isinstance(node.child["No"], DummyMiddleNode):
-                node.child["No"] = node.child["No"].child
-            if isinstance(node.child["Yes"], DummyMiddleNode):
-                node.child["Yes"] = node.child["Yes"].child
-            followNodePath(node.child["No"], col, row + 1)
-            followNodePath(node.child["Yes"], col + 1, row)
-        else:
-            followNodePath(node.child, col, row + 1)
-
-
-def nodeToText(po, node):
-    po[node.row * 3][node.col * blockWidth:(node.col + 1) * blockWidth] = list(map(ord, ("{0:^" + str(blockWidth) + "}").format(str(node))))
-    po[node.row * 3 + 1][node.col * blockWidth:(node.col + 1) * blockWidth] = list(map(ord, ("{0:^" + str(blockWidth) + "}").format("|")))
-    po[node.row * 3 + 2][node.col * blockWidth:(node.col + 1) * blockWidth] = list(map(ord, ("{0:^" + str(blockWidth) + "}").format("V")))
-    if isinstance(node.child, dict):
-        e1 = nodeToText(po, node.child['Yes'])
-        e2 = nodeToText(po, node.child['No'])
-        return max(e1, e2)
-    else:
-        if node.child is None:
-            return (node.row + 1) * 3
+            stack.append(node.child['No'])
+            stack.append(node.child['Yes'])
+        elif node.child is None:
+            lastLine = max(lastLine, (node.row + 1) * 3)
         else:
-            return nodeToText(po, node.child)
+            stack.append(node.child)
+    return lastLine
 
 
 tree = ast.parse(open('test.py', 'r').read())
@@ -254,13 +324,12 @@ followNodePath(start)  # mark each node with it's position in the printout
 # each column: 10 chars for up arrow space, then 50 chars padded for node space
 # each node: 1 line for node itself, 2 lines of arrow (TODO: maybe special case conjunction nodes?)
 
-printout = np.zeros((1000, 1000), dtype=np.uint8)
+rows = collections.defaultdict(dict)  # row -> {col: text}, only the cells that actually have something in them
 
-lastLine = nodeToText(printout, start)
+lastLine = nodeToText(rows, start)
 
-printout[lastLine][0:60] = list(map(ord, "{0:^60}".format('( stop )')))
+rows[lastLine][0] = "{0:^{1}}".format('( stop )', blockWidth)
 
-for line in printout:
-    l = ''.join(map(chr, np.trim_zeros(line)))
-    if l:
-        print(l)
+for r in sorted(rows):
+    cells = rows[r]
+    print(''.join(cells.get(c, emptyCell) for c in range(max(cells) + 1)))
@@ -1,176 +1,223 @@
 import ast
+import concurrent.futures
 import graphviz
-import textwrap
+import pathlib
+import re
 import sys
 
 textwidth = 28
 
 
+wrappedLabels = {}  # (text, width) -> wrapped text, shared by every node with the same label
+
+
+def wrapText(text, width=textwidth):  # greedy word wrap like textwrap.fill, but without building a TextWrapper each time
+    wrapped = wrappedLabels.get((text, width))
+    if wrapped is not None:
+        return wrapped
+    lines = []
+    line = ''
+    for chunk in re.split(r'( +)', text):  # words and the runs of spaces between them, so spacing inside string literals survives
+        if chunk.startswith(' ') and not line and lines:  # spaces where a line got broken don't carry over to the next one
+            continue
+        while len(line) + len(chunk) > width:
+            if chunk.startswith(' '):
+                chunk = ''
+            elif len(chunk) > width:  # words that can't fit on any line get chopped up, filling what's left of the current line first
+                room = width - len(line)
+                line += chunk[:room]
+                chunk = chunk[room:]
+            line = line.rstrip(' ')
+            if line:
+                lines.append(line)
+            line = ''
+        line += chunk
+    line = line.rstrip(' ')
+    if line:
+        lines.append(line)
+    wrapped = wrappedLabels[(text, width)] = '\n'.join(lines)
+    return wrapped
+
+
 class FlowchartNode:
+    __slots__ = ('child', 'index')  # slots keep nodes small and stop typos from quietly making new attributes
+    shape = "tripleoctagon"
+
     def __init__(self):
         self.child = None
         self.index = None
 
     def __str__(self):
-        return textwrap.fill("base flowchart node?", width=textwidth)
-
-    def shape(self):
-        return "tripleoctagon"
+        return "base flowchart node?"
 
 
 class StartNode(FlowchartNode):
+    __slots__ = ()
+    shape = "ellipse"
+
     def __str__(self):
         return "Start"
 
-    def shape(self):
-        return "ellipse"
-
 
 class EndNode(FlowchartNode):
+    __slots__ = ()
+    shape = "ellipse"
+
     def __str__(self):
         return "Stop"
 
-    def shape(self):
-        return "ellipse"
-
 
 class InputNode(FlowchartNode):
+    __slots__ = ('name', 'label')
+    shape = "parallelogram"
+
     def __init__(self, varName):
         self.name = varName
         super().__init__()
+        self.label = wrapText("input {}".format(varName))  # wrapped once here rather than every time the node is drawn
 
     def __str__(self):
-        return textwrap.fill("input {}".format(self.name), width=textwidth)
-
-    def shape(self):
-        return "parallelogram"
+        return self.label
 
 
 class OutputNode(FlowchartNode):
+    __slots__ = ('name', 'label')
+    shape = "parallelogram"
+
     def __init__(self, varName):
         self.name = varName
         super().__init__()
+        self.label = wrapText("output {}".format(varName))
 
     def __str__(self):
-        return textwrap.fill("output {}".format(self.name), width=textwidth)
-
-    def shape(self):
-        return "parallelogram"
+        return self.label
 
 
 class ProcessNode(FlowchartNode):
+    __slots__ = ('text', 'label')
+    shape = "rectangle"
+
     def __init__(self, text):
         self.text = text
         super().__init__()
+        self.label = wrapText(text)
 
     def __str__(self):
-        return textwrap.fill(self.text, width=textwidth)
-
-    def shape(self):
-        return "rectangle"
+        return self.label
 
 
 class VariableAssignmentNode(ProcessNode):
+    __slots__ = ()
+
     def __init__(self, varName, expression):
         text = "{} = {}".format(varName, expression)
         super().__init__(text)
 
 
 class ConditionalNode(FlowchartNode):
+    __slots__ = ('condition', 'label')
+    shape = "diamond"
+
     def __init__(self, condition):
         self.condition = condition
         super().__init__()
         self.child = {"No": None, "Yes": None}
+        self.label = wrapText(condition)
 
     def __str__(self):
-        return textwrap.fill(self.condition, width=textwidth)
-
-    def shape(self):
-        return "diamond"
+        return self.label
 
 
 class SubProcessNode(FlowchartNode):
+    __slots__ = ('name', 'label')
+    shape = "rectangle"
+
     def __init__(self, subprocessName):
         self.name = subprocessName
         super().__init__()
+        self.label = wrapText("| {} |".format(subprocessName))
 
     def __str__(self):
-        return textwrap.fill("| {} |".format(self.name), width=textwidth)
-
-    def shape(self):
-        return "rectangle"
+        return self.label
 
 
 class DummyConjunctionNode(FlowchartNode):  # node to allow two nodes to return to the same place
+    __slots__ = ()
+    shape = None
+
     def __init__(self):
         super().__init__()
 
     def __str__(self):
         return "     | <---"
 
-    def shape(self):
-        return None
-
 
 class DummyMiddleNode(FlowchartNode):
+    __slots__ = ()
+
     def __str__(self):
         return ''
 
 
-class FlowchartMakingVisitor(ast.NodeVisitor):
-    operators = {ast.Mult: '*', ast.Add: '+', ast.Sub: '-', ast.Div: '/', ast.Or: 'or', ast.And: 'and', ast.Gt: '>', ast.Lt: '<', ast.Eq: '=', ast.NotEq: '!='}
+operators = {ast.Mult: '*', ast.Add: '+', ast.Sub: '-', ast.Div: '/', ast.Or: 'or', ast.And: 'and', ast.Gt: '>', ast.Lt: '<', ast.Eq: '=', ast.NotEq: '!='}  # keyed on the exact operator class
 
+
+class FlowchartMakingVisitor(ast.NodeVisitor):
     def __init__(self):
         self.start = StartNode()
         self.currentParent = self.start
 
     def visit_Module(self, node: ast.Module):
-        for n in node.body:
-            self.visit(n)
+        self.visitBlock(node.body)
         self.appendNode(EndNode())
 
     def visit_Assign(self, node):
-        if isinstance(node.value, ast.Call):  # special case for / input / nodes
-            if node.value.func.id == 'input':
+        value = node.value
+        if isinstance(value, ast.Call):  # special case for / input / nodes
+            if getattr(value.func, 'id', None) == 'input':
                 self.appendNode(InputNode(node.targets[0].id))
                 return
-            if isinstance(node.value.args[0], ast.Call) and node.value.args[0].func.id == 'input':  # basically, assume that any single function wrapping an input() statement in an assign is just a typecast
+            if value.args and isinstance(value.args[0], ast.Call) and getattr(value.args[0].func, 'id', None) == 'input':  # basically, assume that any single function wrapping an input() statement in an assign is just a typecast
                 self.appendNode(InputNode(node.targets[0].id))
                 return
-        rhs = self.parseChunk(node.value)
+        rhs = self.parseChunk(value)
         self.appendNode(VariableAssignmentNode(node.targets[0].id, rhs))
 
     def visit_AugAssign(self, node):
         rhs = self.parseChunk(node.value)
-        self.appendNode(VariableAssignmentNode(node.target.id, "{0} {1} {2}".format(node.target.id, self.operators[node.op.__class__], rhs)))
+        self.appendNode(VariableAssignmentNode(node.target.id, "{0} {1} {2}".format(node.target.id, operators[type(node.op)], rhs)))
 
     def visit_Expr(self, node):
         if isinstance(node.value, ast.Call):
-            if node.value.func.id in {'print', 'pprint'}:  # / output / special casing
+            if getattr(node.value.func, 'id', None) in {'print', 'pprint'}:  # / output / special casing
                 self.appendNode(OutputNode(', '.join(self.parseFunctionArgs(node.value))))
             else:
                 self.appendNode(ProcessNode(self.parseFunctionCall(node.value)))
         else:
             raise Exception("Unknown Node type in Expr: {0} (line {0.lineno} col {0.col_offset})".format(node.value))
 
-    def visit_If(self, node):
+    def visit_If(self, node):  # returns the yes and no branches for visitBlock to go through rather than visiting them itself
         cond = self.parseChunk(node.test)
 
         condNode = ConditionalNode(cond)
         self.appendNode(condNode)
         condNode.child['Yes'] = DummyMiddleNode()
         self.currentParent = condNode.child['Yes']
-        for n in node.body:
-            self.visit(n)
-        endbody = self.currentParent  # so we can connect it to the endcap eventually
-        condNode.child['No'] = DummyMiddleNode()
-        self.currentParent = condNode.child['No']
-        for n in node.orelse:
-            self.visit(n)
-        endcap = DummyConjunctionNode()
-        endbody.child = endcap
-        self.currentParent.child = endcap
-        self.currentParent = endcap
+        endbody = None
+
+        def startElse():
+            nonlocal endbody
+            endbody = self.currentParent  # so we can connect it to the endcap eventually
+            condNode.child['No'] = DummyMiddleNode()
+            self.currentParent = condNode.child['No']
+
+        def joinBranches():
+            endcap = DummyConjunctionNode()
+            endbody.child = endcap
+            self.currentParent.child = endcap
+            self.currentParent = endcap
+
+        return [(node.body, startElse), (node.orelse, joinBranches)]
 
     def visit_ImportFrom(self, node):
         pass
@@ -183,21 +230,53 @@ class FlowchartMakingVisitor(ast.NodeVisitor):
         self.appendNode(condNode)
         condNode.child["Yes"] = DummyMiddleNode()
         self.currentParent = condNode.child["Yes"]
-        for n in node.body:
-            self.visit(n)
-        self.currentParent.child = top  # loop back
-        condNode.child["No"] = DummyMiddleNode()
-        self.currentParent = condNode.child["No"]
+
+        def exitLoop():
+            self.currentParent.child = top  # loop back
+            condNode.child["No"] = DummyMiddleNode()
+            self.currentParent = condNode.child["No"]
+
+        return [(node.body, exitLoop)]
 
     def generic_visit(self, node):
         raise Exception("Unknown Node type: {0} (line {0.lineno} col {0.col_offset})".format(node))
 
+    def visit(self, node):  # replaces ast.NodeVisitor.visit, which builds the method name and getattr()s it for every statement
+        visitor = self.statementVisitors.get(type(node))
+        if visitor is None:
+            return self.generic_visit(node)
+        return visitor(self, node)
+
+    def visitBlock(self, body):  # nested ifs and whiles go on an explicit stack instead of recursing, so deep nesting can't hit the recursion limit
+        blocks = [(iter(body), None)]
+        while blocks:
+            statements, onEnd = blocks[-1]
+            n = next(statements, None)
+            if n is None:
+                blocks.pop()
+                if onEnd is not None:
+                    onEnd()
+                continue
+            nested = self.visit(n)  # list of (statements, called once they're all visited), first one gets visited first
+            if nested:
+                blocks.extend((iter(b), e) for b, e in reversed(nested))
+
+    statementVisitors = {
+        ast.Module: visit_Module,
+        ast.Assign: visit_Assign,
+        ast.AugAssign: visit_AugAssign,
+        ast.Expr: visit_Expr,
+        ast.If: visit_If,
+        ast.ImportFrom: visit_ImportFrom,
+        ast.While: visit_While,
+    }
+
     def appendNode(self, node):
         self.currentParent.child = node
         self.currentParent = node
 
     def parseFunctionCall(self, call):
-        name = call.func.id
+        name = self.parseChunk(call.func)  # a plain name or an attribute like obj.method
         args = self.parseFunctionArgs(call)
         return "{0}({1})".format(name, ', '.join(map(str, args)))
 
@@ -211,84 +290,90 @@ class FlowchartMakingVisitor(ast.NodeVisitor):
         left = self.parseChunk(op.left)
         right = self.parseChunk(op.right)
 
-        return "{0} {1} {2}".format(left, self.operators[op.op.__class__], right)
+        return "{0} {1} {2}".format(left, operators[type(op.op)], right)
 
     def parseBoolOp(self, op):
         things = []
         for thing in op.values:
             things.append(self.parseChunk(thing))
-        return (' ' + self.operators[op.op.__class__] + ' ').join(things)
+        return (' ' + operators[type(op.op)] + ' ').join(things)
 
     def parseCompare(self, op):
-        str = self.parseChunk(op.left)
-        for i in range(len(op.ops)):
-            str += ' ' + self.operators[op.ops[i].__class__] + ' ' + self.parseChunk(op.comparators[i])
-        return str
+        parts = [self.parseChunk(op.left)]
+        for o, c in zip(op.ops, op.comparators):
+            parts.append(operators[type(o)])
+            parts.append(self.parseChunk(c))
+        return ' '.join(parts)
+
+    def parseConstant(self, const):
+        if isinstance(const.value, str):
+            return repr(const.value)
+        if isinstance(const.value, (int, float, complex)) and not isinstance(const.value, bool):
+            return str(const.value)
+        raise Exception("Unknown constant to parse: {0!r} (line {1.lineno} col {1.col_offset})".format(const.value, const))
 
     def parseChunk(self, o):  # parse pretty much anything
-        if isinstance(o, ast.BinOp):
-            return '(' + self.parseBinOp(o) + ')'
-        elif isinstance(o, ast.Num):
-            return str(o.n)
-        elif isinstance(o, ast.Name):
-            return o.id
-        elif isinstance(o, ast.Str):
-            return repr(o.s)
-        elif isinstance(o, ast.Call):
-            return self.parseFunctionCall(o)
-        elif isinstance(o, ast.BoolOp):
-            return '(' + self.parseBoolOp(o) + ')'
-        elif isinstance(o, ast.Compare):
-            return '(' + self.parseCompare(o) + ')'
-        else:
+        parser = self.chunkParsers.get(type(o))  # exact type lookup, ast node classes are never subclassed
+        if parser is None:
             raise Exception("Unknown object to parse: {0} (line {0.lineno} col {0.col_offset})".format(o))
+        return parser(self, o)
 
+    chunkParsers = {
+        ast.BinOp: lambda self, o: '(' + self.parseBinOp(o) + ')',
+        ast.Constant: parseConstant,  # numbers and strings both come out of the parser as Constant
+        ast.Name: lambda self, o: o.id,
+        ast.Attribute: lambda self, o: self.parseChunk(o.value) + '.' + o.attr,
+        ast.Call: parseFunctionCall,
+        ast.BoolOp: lambda self, o: '(' + self.parseBoolOp(o) + ')',
+        ast.Compare: lambda self, o: '(' + self.parseCompare(o) + ')',
+    }
 
-def deleteExtraneousNodes(node):
-    if node.index == 0:
-        return
-    if isinstance(node.child, dict):
-        for n in node.child:
-            if isinstance(node.child[n], (DummyMiddleNode, DummyConjunctionNode)):
-                node.child[n] = node.child[n].child
-                deleteExtraneousNodes(node)  # test for if there's two dummy nodes one after another
-            else:
-                deleteExtraneousNodes(node.child[n])
-        node.index = 0
-    elif node.child:
-        if isinstance(node.child, (DummyMiddleNode, DummyConjunctionNode)):
-            node.child = node.child.child
-            deleteExtraneousNodes(node)
-        else:
-            node.index = 0
-            deleteExtraneousNodes(node.child)
+
+dummyNodes = (DummyMiddleNode, DummyConjunctionNode)
+
+
+def skipDummies(node):  # dummy nodes are only there to build the graph, follow them to the real node they lead to
+    while isinstance(node, dummyNodes):
+        node = node.child
+    return node
 
 
 directions = {"No": "s", "Yes": "e"}  # choose which corner of the node each child will come out of. Statically chosen, which makes some layouts uglier but overall helps
 
 
-def generateGraph(graph: graphviz.Digraph, node):
+def childEdges(node):  # (parent id, label, child) for each edge coming out of node, in the order they get drawn
+    nodeId = f"node{node.index}"
     if isinstance(node.child, dict):
-        ind = node.index + 1
-        for n in node.child:
-            if node.child[n].index:
-                graph.edge("node{}".format(node.index), "node{}".format(node.child[n].index), label=n, tailport=directions[n], headport='n')
-            else:
-                graph.node("node{}".format(ind), str(node.child[n]), shape=node.child[n].shape())
-                graph.edge("node{}".format(node.index), "node{}".format(ind), label=n, tailport=directions[n], headport='n')
-                node.child[n].index = ind
-                ind = generateGraph(graph, node.child[n]) + 1
-        return ind
+        return [(nodeId, n, skipDummies(node.child[n])) for n in node.child]
     elif node.child:
-        if node.child.index:  # must be looping back
-            graph.edge("node{}".format(node.index), "node{}".format(node.child.index), tailport='s', headport='n')
-            return node.index + 1
+        return [(nodeId, None, skipDummies(node.child))]
+    return []
+
+
+def escapeLabel(text):  # just enough DOT quoting for our labels, without graphviz's general purpose quoting for every attribute
+    return text.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def generateGraph(graph: graphviz.Digraph, start):  # writes the DOT lines straight into the graph body rather than going through graph.node/graph.edge
+    lines = []
+    ind = start.index
+    stack = childEdges(start)[::-1]  # reversed so the first edge gets popped first
+    while stack:
+        nodeId, label, child = stack.pop()
+        if child.index:  # loop backs point at a node that has already been drawn
+            childId = f"node{child.index}"
         else:
-            graph.node("node{}".format(node.index + 1), str(node.child), shape=node.child.shape())
-            node.child.index = node.index + 1
-            graph.edge("node{}".format(node.index), "node{}".format(node.child.index), tailport='s', headport='n')
-            return generateGraph(graph, node.child) + 1
-    return node.index
+            ind += 1
+            child.index = ind
+            childId = f"node{ind}"
+            lines.append(f'\t{childId} [label="{escapeLabel(str(child))}" shape={child.shape}]\n')
+            stack.extend(reversed(childEdges(child)))
+        if label:
+            lines.append(f'\t{nodeId} -> {childId} [label={label} headport=n tailport={directions[label]}]\n')
+        else:
+            lines.append(f'\t{nodeId} -> {childId} [headport=n tailport=s]\n')
+    graph.body.extend(lines)
+    return ind
 
 
 def printNodes(node):
@@ -302,37 +387,52 @@ def printNodes(node):
         printNodes(node.child)
 
 
-def main():
-    try:
-        filename = sys.argv[1]
-    except IndexError:
-        print("No filename passed in")
-        sys.exit(1)
+def makeFlowchart(filename, outputName):  # returns None once the chart is made, or a message saying why it couldn't be
     try:
-        ftext = open(filename, 'r').read()
+        ftext = pathlib.Path(filename).read_text()
     except FileNotFoundError:
-        print("Cannot find the file '{}'".format(filename))
-        sys.exit(1)
+        return "Cannot find the file '{}'".format(filename)
+    except (OSError, UnicodeDecodeError) as e:  # directories, unreadable files, files that aren't utf-8 text
+        return "Cannot read the file '{}':\n{}".format(filename, e)
     try:
         tree = ast.parse(ftext)
-    except SyntaxError as e:
-        print("Invalid syntax in file:")
+    except (SyntaxError, ValueError) as e:  # ast.parse raises ValueError for source containing null bytes
+        return "Invalid syntax in file '{}':\n{}".format(filename, e)
+
+    try:  # anything the visitor can't chart, or dot failing, only fails this file and not the rest of the batch
+        visitor = FlowchartMakingVisitor()
+        visitor.visit(tree)
+        start = visitor.start
+        g = graphviz.Digraph(format='png', engine='dot')
+        g.attr(splines='spline')
+        g.attr(overlap='voronoi')
+        g.attr(concentrate='false')
+        g.node('node1', str(start), shape=start.shape)
+        start.index = 1
+        generateGraph(g, start)
+        g.view(filename=outputName)
+    except Exception as e:
+        return "Could not make a flowchart of '{}':\n{}".format(filename, e)
+    return None
+
+
+def main():
+    filenames = sys.argv[1:]
+    if not filenames:
+        print("No filename passed in")
+        sys.exit(1)
+    if len(filenames) == 1:
+        errors = [makeFlowchart(filenames[0], "flowchart")]
+    else:  # every file gets its own chart next to it, and rendering them is mostly waiting on dot so do them in parallel
+        outputNames = [str(pathlib.Path(f).with_suffix(".flowchart")) for f in filenames]
+        with concurrent.futures.ProcessPoolExecutor() as pool:
+            errors = list(pool.map(makeFlowchart, filenames, outputNames))
+    errors = [e for e in errors if e is not None]
+    for e in errors:
         print(e)
+    if errors:
         sys.exit(1)
 
-    visitor = FlowchartMakingVisitor()
-    visitor.visit(tree)
-    start = visitor.start
-    deleteExtraneousNodes(start)
-    g = graphviz.Digraph(format='png', engine='dot')
-    g.attr(splines='spline')
-    g.attr(overlap='voronoi')
-    g.attr(concentrate='false')
-    g.node('node1', str(start), shape=start.shape())
-    start.index = 1
-    generateGraph(g, start)
-    g.view(filename="flowchart")
-
 
 if __name__ == '__main__':
     main()